@@ -0,0 +1,130 @@
+"""
+Post-processing for the colorbar frame captured by test_tpg.py
+
+Usage: python analyze_colorbar.py [frame_file] [output_file]
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+
+def detect_color_bars(first_line):
+    """Return bar boundaries and normalized bar colors for a single line"""
+    width = first_line.shape[0]
+
+    # Detect color transitions
+    diffs = np.any(np.diff(first_line.astype(np.int16), axis=0) != 0, axis=1)
+    color_changes = (np.flatnonzero(diffs) + 1).tolist()
+
+    # Extract bar colors from first line (sampled at the middle of each bar)
+    bar_positions = [0] + color_changes + [width]
+    bounds = np.array(bar_positions)
+    bar_colors = first_line[(bounds[:-1] + bounds[1:]) // 2] / 255.0  # Normalize
+
+    return bar_positions, bar_colors
+
+
+def plot_colorbar_analysis(frame, output_file):
+    """Render the colorbar analysis figure for a captured frame"""
+    # matplotlib is slow to import, only load it when a figure is requested
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    height, width = frame.shape[:2]
+
+    fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+    fig.suptitle(
+        "AXI Stream Color Bar Pattern Analysis", fontsize=16, fontweight="bold"
+    )
+
+    # 1. Full frame
+    axes[0, 0].imshow(frame)
+    axes[0, 0].set_title(f"Full Frame ({width}x{height})")
+    axes[0, 0].axis("off")
+
+    # 2. First line profile
+    first_line = frame[0, :, :]
+    axes[0, 1].imshow(first_line[np.newaxis, :, :], aspect="auto")
+    axes[0, 1].set_title("First Line (Horizontal Slice)")
+    axes[0, 1].set_xlabel("X Position")
+    axes[0, 1].set_yticks([])
+
+    # 3. RGB channel values along first line
+    axes[1, 0].plot(first_line[:, 0], "r-", label="Red", linewidth=2)
+    axes[1, 0].plot(first_line[:, 1], "g-", label="Green", linewidth=2)
+    axes[1, 0].plot(first_line[:, 2], "b-", label="Blue", linewidth=2)
+    axes[1, 0].set_title("RGB Channel Values (First Line)")
+    axes[1, 0].set_xlabel("X Position (pixels)")
+    axes[1, 0].set_ylabel("Channel Value (0-255)")
+    axes[1, 0].legend()
+    axes[1, 0].grid(True, alpha=0.3)
+    axes[1, 0].set_ylim(-10, 265)
+
+    # 4. Color bar identification
+    bar_positions, bar_colors = detect_color_bars(first_line)
+    num_bars = len(bar_colors)
+
+    # Plot color bars
+    for i, (start, end, color) in enumerate(
+        zip(bar_positions[:-1], bar_positions[1:], bar_colors)
+    ):
+        width_px = end - start
+        axes[1, 1].barh(
+            0,
+            width_px,
+            left=start,
+            height=0.8,
+            color=color,
+            edgecolor="black",
+            linewidth=1.5,
+        )
+
+        # Add text label
+        mid = (start + end) / 2
+        color_hex = "#{:02x}{:02x}{:02x}".format(
+            int(color[0] * 255), int(color[1] * 255), int(color[2] * 255)
+        )
+        axes[1, 1].text(
+            mid,
+            0,
+            f"Bar {i + 1}\n{color_hex}",
+            ha="center",
+            va="center",
+            fontsize=8,
+            fontweight="bold",
+        )
+
+    axes[1, 1].set_title(f"Detected Color Bars (n={num_bars})")
+    axes[1, 1].set_xlabel("X Position (pixels)")
+    axes[1, 1].set_xlim(0, width)
+    axes[1, 1].set_ylim(-0.5, 0.5)
+    axes[1, 1].set_yticks([])
+
+    plt.tight_layout()
+
+    # Save figure
+    fig.savefig(output_file, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    frame_file = Path(
+        sys.argv[1] if len(sys.argv) > 1 else "test_results/colorbar_frame.npz"
+    )
+    output_file = (
+        Path(sys.argv[2])
+        if len(sys.argv) > 2
+        else frame_file.with_name("colorbar_pattern_analysis.png")
+    )
+
+    # Frames are saved compressed (.npz), plain .npy is still accepted
+    frame = np.load(frame_file)
+    if frame_file.suffix == ".npz":
+        frame = frame["frame"]
+
+    plot_colorbar_analysis(frame, output_file)
+    print(f"Visualization saved to: {output_file}")
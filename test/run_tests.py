@@ -3,12 +3,40 @@
 # =============================================================================
 # File: run_tests.py
 
+import json
 import os
 from pathlib import Path
 
 from cocotb_tools.runner import get_runner
 
 
+# Simulator executables produced by runner.build(), used to skip rebuilds
+BUILD_ARTIFACTS = {
+    "icarus": lambda toplevel: "sim.vvp",
+    "verilator": lambda toplevel: toplevel,
+}
+
+# Build configuration of the last build, a change forces a rebuild
+BUILD_STAMP = "build_config.json"
+
+
+def needs_build(sim, build_dir, toplevel, sources, config):
+    """Check whether the design has to be (re)built"""
+    if os.getenv("FORCE_BUILD", "0") == "1" or sim not in BUILD_ARTIFACTS:
+        return True
+
+    artifact = build_dir / BUILD_ARTIFACTS[sim](toplevel)
+    stamp = build_dir / BUILD_STAMP
+    if not artifact.exists() or not stamp.exists():
+        return True
+
+    if json.loads(stamp.read_text()) != config:
+        return True
+
+    built = artifact.stat().st_mtime
+    return any(Path(src).stat().st_mtime > built for src in sources)
+
+
 def test_axi_pattern_gen():
     """Run the AXI Stream pattern generator tests"""
 
@@ -23,6 +51,9 @@ def test_axi_pattern_gen():
         proj_path / "../src/v/axis_tpg.v",
     ]
 
+    # Build directory, kept between runs so unchanged RTL is not rebuilt
+    build_dir = Path(os.getenv("SIM_BUILD", proj_path / "sim_build"))
+
     # Test module (Python file without .py extension)
     test_module = "test_tpg"
 
@@ -32,31 +63,54 @@ def test_axi_pattern_gen():
     # Create runner
     runner = get_runner(sim)
 
+    # Waveforms are opt-in (WAVES=1), dumping slows simulation down considerably
+    waves = os.getenv("WAVES", "0") == "1"
+
     # Build arguments (simulator-specific)
     build_args = []
-    if sim == "verilator":
-        build_args = ["--trace", "--trace-structs"]
+    if sim == "verilator" and waves:
+        build_args = ["--trace"]
+        # Struct members are only traced on request (WAVES_FULL=1)
+        if os.getenv("WAVES_FULL", "0") == "1":
+            build_args.append("--trace-structs")
     elif sim == "icarus":
         build_args = []
 
     # Parameters to pass to the DUT
     parameters = {"WIDTH": 256, "HEIGHT": 256, "DATA_WIDTH": 24, "sel_i_WIDTH": 3}
 
-    print("Starting build")
-
-    # Build the design
-    runner.build(
-        sources=sources,
-        hdl_toplevel=toplevel,
-        build_args=build_args,
-        parameters=parameters,
-    )
+    # Everything that affects the build output, compared against the stamp
+    build_config = {
+        "sim": sim,
+        "toplevel": toplevel,
+        "build_args": build_args,
+        "parameters": parameters,
+        "waves": waves,
+    }
+
+    # Build the design (FORCE_BUILD=1 rebuilds unconditionally)
+    if needs_build(sim, build_dir, toplevel, sources, build_config):
+        print("Starting build")
+        runner.build(
+            sources=sources,
+            hdl_toplevel=toplevel,
+            build_args=build_args,
+            parameters=parameters,
+            build_dir=build_dir,
+            waves=waves,
+            always=True,
+        )
+        (build_dir / BUILD_STAMP).write_text(json.dumps(build_config))
+    else:
+        print(f"Build in {build_dir} is up to date, skipping")
 
     # Run the tests
     runner.test(
         hdl_toplevel=toplevel,
+        hdl_toplevel_lang="verilog",
+        build_dir=build_dir,
         test_module=test_module,
-        waves=True,  # Generate waveforms
+        waves=waves,
     )
 
 
@@ -2,11 +2,14 @@
 Cocotb testbench for image_aggregator_top
 """
 
+import itertools
+import logging
 import random
 
 import cocotb
+import numpy as np
 from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, Timer
+from cocotb.triggers import Combine, SimTimeoutError, Timer, with_timeout
 from cocotbext.axi import AxiStreamBus, AxiStreamFrame, AxiStreamSink, AxiStreamSource
 
 # Image configuration
@@ -22,8 +25,11 @@ class ImageAggregatorTB:
     def __init__(self, dut):
         self.dut = dut
 
-        # Create clock
-        cocotb.start_soon(Clock(dut.clk_i, 10, unit="ns").start())
+        # NumPy generator seeded from cocotb's RNG, so runs replay with RANDOM_SEED
+        self.rng = np.random.default_rng(random.getrandbits(32))
+
+        # Create clock, toggled by the simulator rather than a Python coroutine
+        cocotb.start_soon(Clock(dut.clk_i, 10, unit="ns", impl="gpi").start())
 
         # Create AXI Stream sources for 4 inputs
         self.source0 = AxiStreamSource(
@@ -64,43 +70,41 @@ class ImageAggregatorTB:
 
     async def reset(self):
         """Reset the DUT"""
-        self.dut.rstn_i.value = 0
+        clk = self.dut.clk_i
+        rstn = self.dut.rstn_i
+
+        rstn.value = 0
         await Timer(100, unit="ns")
-        await RisingEdge(self.dut.clk_i)
-        self.dut.rstn_i.value = 1
-        await RisingEdge(self.dut.clk_i)
+        await clk.rising_edge
+        rstn.value = 1
+        await clk.rising_edge
         self.dut._log.info("Reset complete")
 
     def generate_test_image(self, width, height, pattern="counter"):
-        """Generate a test image as a list of 32-bit words"""
-        pixels = []
-        for row in range(height):
-            for col in range(width):
-                if pattern == "counter":
-                    # Simple counter pattern
-                    pixel_value = (row * width + col) & 0xFFFFFFFF
-                elif pattern == "random":
-                    # Random pattern
-                    pixel_value = random.randint(0, 0xFFFFFFFF)
-                elif pattern == "gradient":
-                    # Gradient pattern
-                    pixel_value = ((row * 255 // height) << 16) | (
-                        (col * 255 // width) << 8
-                    )
-                else:
-                    pixel_value = 0
-
-                pixels.append(pixel_value)
-
-        return pixels
+        """Generate a test image as a flat array of 32-bit words"""
+        if pattern == "counter":
+            # Simple counter pattern
+            return np.arange(width * height, dtype=np.uint32)
+        elif pattern == "random":
+            # Random pattern
+            return self.rng.integers(0, 2**32, size=width * height, dtype=np.uint32)
+        elif pattern == "gradient":
+            # Gradient pattern
+            r = (np.arange(height) * 255 // height).astype(np.uint32)[:, None]
+            c = (np.arange(width) * 255 // width).astype(np.uint32)[None, :]
+            return ((r << 16) | (c << 8)).ravel()
+        else:
+            return np.zeros(width * height, dtype=np.uint32)
 
     async def send_image(self, source, image_data, sof=True):
         """Send an image through an AXI Stream source"""
         frame = AxiStreamFrame()
 
-        # Convert pixel data to bytes (little-endian 32-bit)
-        for pixel in image_data:
-            frame.tdata.extend(pixel.to_bytes(4, byteorder="little"))
+        # Convert pixel data to bytes (little-endian 32-bit), copied straight
+        # into a preallocated buffer
+        pixels = np.asarray(image_data).ravel()
+        frame.tdata = bytearray(pixels.size * 4)
+        np.frombuffer(frame.tdata, dtype="<u4")[:] = pixels
 
         # Set SOF on first transfer if requested
         if sof:
@@ -109,7 +113,7 @@ class ImageAggregatorTB:
             frame.tuser = 0
 
         await source.send(frame)
-        self.dut._log.info(f"Sent image with {len(image_data)} pixels")
+        self.dut._log.info(f"Sent image with {pixels.size} pixels")
 
 
 @cocotb.test()
@@ -119,7 +123,7 @@ async def test_reset(dut):
     await tb.reset()
 
     # Check that all ready signals are low after reset
-    await RisingEdge(dut.clk_i)
+    await dut.clk_i.rising_edge
     assert dut.s0_tready_o.value == 0, "s0_tready should be low after reset"
     assert dut.s1_tready_o.value == 0, "s1_tready should be low after reset"
     assert dut.s2_tready_o.value == 0, "s2_tready should be low after reset"
@@ -143,20 +147,20 @@ async def test_single_frame(dut):
     img2 = tb.generate_test_image(width, height, pattern="random")
     img3 = tb.generate_test_image(width, height, pattern="counter")
 
-    # Send images to all 4 inputs
-    await cocotb.start_soon(tb.send_image(tb.source0, img0, sof=True))
-    await cocotb.start_soon(tb.send_image(tb.source1, img1, sof=True))
-    await cocotb.start_soon(tb.send_image(tb.source2, img2, sof=True))
-    await cocotb.start_soon(tb.send_image(tb.source3, img3, sof=True))
-
-    # Wait for output
-    await Timer(10, unit="us")
-
-    # Check if we received any output
-    if not tb.sink.empty():
-        output_frame = await tb.sink.recv()
+    # Send images to all 4 inputs concurrently
+    tasks = [
+        cocotb.start_soon(tb.send_image(tb.source0, img0, sof=True)),
+        cocotb.start_soon(tb.send_image(tb.source1, img1, sof=True)),
+        cocotb.start_soon(tb.send_image(tb.source2, img2, sof=True)),
+        cocotb.start_soon(tb.send_image(tb.source3, img3, sof=True)),
+    ]
+    await Combine(*tasks)
+
+    # Wait for output, returning as soon as a frame arrives
+    try:
+        output_frame = await with_timeout(tb.sink.recv(), 10, "us")
         dut._log.info(f"Received output frame with {len(output_frame.tdata)} bytes")
-    else:
+    except SimTimeoutError:
         dut._log.warning("No output received (design stub not implemented)")
 
     dut._log.info("Single frame test complete")
@@ -169,7 +173,9 @@ async def test_backpressure(dut):
     await tb.reset()
 
     # Set backpressure on output
-    tb.sink.set_pause_generator(lambda: random.choice([0, 1, 2, 3]))
+    # Pause pattern is drawn once up front and cycled through
+    pause_vec = tb.rng.integers(0, 4, size=1 << 16, dtype=np.uint8)
+    tb.sink.set_pause_generator(itertools.cycle(pause_vec.tolist()))
 
     # Generate and send test images
     width = C_PIXELS_PER_ROW // 2
@@ -192,12 +198,22 @@ async def test_state_machine(dut):
     await tb.reset()
 
     # Wait a few cycles and observe state transitions
-    for i in range(20):
-        await RisingEdge(dut.clk_i)
-        # State machine should be in S_WAIT_SOF initially
-        dut._log.info(
-            f"Cycle {i}: ready signals = {dut.s0_tready.value}, "
-            f"{dut.s1_tready.value}, {dut.s2_tready.value}, {dut.s3_tready.value}"
-        )
+    # State machine should be in S_WAIT_SOF initially
+    log_states = dut._log.isEnabledFor(logging.INFO)
+    readies = [
+        dut.s0_tready_o.tready,
+        dut.s1_tready_o.tready,
+        dut.s2_tready_o.tready,
+        dut.s3_tready_o.tready,
+    ]
+    states = []
+    for _ in range(20):
+        await dut.clk_i.rising_edge
+        if log_states:
+            # Kept as strings so U/X values are logged rather than raising
+            states.append("".join(str(ready.value) for ready in readies))
+
+    if log_states:
+        dut._log.info("Ready signals (s0-s3) per cycle: %s", " ".join(states))
 
     dut._log.info("State machine test complete")